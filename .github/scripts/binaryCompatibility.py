@@ -4,21 +4,31 @@
 import argparse
 import json
 import os
-import xml.etree.ElementTree as ET
 
 from agithub.GitHub import GitHub
+from lxml import etree
 
+COMMENTS_PER_PAGE = 100
 
-def findall_recursive(node, element):
-    for item in node.findall(element):
-        yield item
-    for item in list(node):
-        yield from findall_recursive(item, element)
+
+def find_comment(comments, text):
+    """Return the first comment containing the given text, fetching pages only until it is found."""
+    page = 1
+    while True:
+        status, page_comments = comments.get(per_page=COMMENTS_PER_PAGE, page=page)
+        if status != 200:
+            return None
+        for comment in page_comments:
+            if text in comment["body"]:
+                return comment
+        if len(page_comments) < COMMENTS_PER_PAGE:
+            return None
+        page += 1
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--input', type=argparse.FileType('r'), help='Input file to parse')
+    parser.add_argument('--input', type=argparse.FileType('rb'), help='Input file to parse')
     parser.add_argument('--token', type=str, help='GitHub token')
     parser.add_argument('--pr', type=str, help='GitHub PR')
     parser.add_argument('--sha', type=str, help='GitHub SHA')
@@ -27,50 +37,54 @@ def main():
     file = args.input
 
     my_body_dedupe = "Produced by binaryCompatability.py"
-    body = f"Binary incompatibility detected for commit {args.sha}.\n" \
-           f" See the uploaded artifacts from the action for details. You must bump the version number.\n\n"
+    body_parts = [f"Binary incompatibility detected for commit {args.sha}.\n"
+                  f" See the uploaded artifacts from the action for details. You must bump the version number.\n\n"]
 
     incompatible = False
-    tree = ET.parse(file)
-    for clazz in tree.getroot().findall("./classes/class"):
+    # Stream the report one class at a time so that large japicmp reports are never fully held in memory
+    for _, clazz in etree.iterparse(file, events=("end",), tag="class"):
         any_incompatible = False
-        body += f"{clazz.attrib['fullyQualifiedName']} is "
+        body_parts.append(f"{clazz.attrib['fullyQualifiedName']} is ")
         if clazz.attrib['binaryCompatible'] == "false":
-            body += "binary incompatible"
+            body_parts.append("binary incompatible")
             incompatible = True
             any_incompatible = True
         if clazz.attrib['sourceCompatible'] == "false":
             if any_incompatible:
-                body += " and is "
-            body += "source incompatible"
+                body_parts.append(" and is ")
+            body_parts.append("source incompatible")
             any_incompatible = True
         if any_incompatible:
-            body += f" because of " \
-                    f"{', '.join({x.text for x in findall_recursive(clazz, 'compatibilityChanges/compatibilityChange')})}"
+            # Only walk the class's changes when it is incompatible, collecting the text directly from libxml2
+            reasons = set(clazz.xpath(".//compatibilityChanges/compatibilityChange/text()"))
+            body_parts.append(f" because of {', '.join(reasons)}")
         else:
-            body += "fully compatible"
-        body += "\n"
-    body += "\n" + my_body_dedupe
+            body_parts.append("fully compatible")
+        body_parts.append("\n")
+
+        # Drop the processed class and any siblings before it now that we're done with them
+        clazz.clear()
+        while clazz.getprevious() is not None:
+            del clazz.getparent()[0]
+    body_parts.append("\n" + my_body_dedupe)
+    body = "".join(body_parts)
 
     token = args.token
     pr = args.pr
 
     gh = GitHub(token=token)
-    existing_comments = gh.repos[os.getenv("GITHUB_REPOSITORY")].issues[pr].comments.get()
-    if existing_comments[0] == 200:
-        existing_comments = list(filter(lambda i: my_body_dedupe in i["body"], existing_comments[1]))
-    else:
-        existing_comments = []
-
-    if existing_comments:
-        comment_id = existing_comments[0]["id"]
+    repository = os.getenv("GITHUB_REPOSITORY")
+    existing_comment = find_comment(gh.repos[repository].issues[pr].comments, my_body_dedupe)
+
+    if existing_comment:
+        comment_id = existing_comment["id"]
         if incompatible:
-            updated_issue = gh.repos[os.getenv("GITHUB_REPOSITORY")].issues.comments[comment_id].patch(body={"body": body})
+            updated_issue = gh.repos[repository].issues.comments[comment_id].patch(body={"body": body})
             print(updated_issue, flush=True)
         else:
-            gh.repos[os.getenv("GITHUB_REPOSITORY")].issues.comments[comment_id].delete()
+            gh.repos[repository].issues.comments[comment_id].delete()
     elif incompatible:
-        issue = gh.repos[os.getenv("GITHUB_REPOSITORY")].issues[pr].comments.post(body={"body": body})
+        issue = gh.repos[repository].issues[pr].comments.post(body={"body": body})
         print(issue, flush=True)
 
 
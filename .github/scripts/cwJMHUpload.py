@@ -7,6 +7,8 @@ Script to upload test metrics to CloudWatch
 import json
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 import boto3
 
@@ -19,9 +21,12 @@ from retryable import retry
 
 
 def batch(iterable, batch_size=1):
-    length = len(iterable)
-    for index in range(0, length, batch_size):
-        yield iterable[index:min(index + batch_size, length)]
+    # Works with any iterable, including generators, since it never needs the length up front
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, batch_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, batch_size))
 
 
 @retry()
@@ -38,21 +43,25 @@ def put_dashboard_retryable(cw, dashboard_name, dashboard_data):
     cw.put_dashboard(DashboardName=dashboard_name, DashboardBody=json.dumps(dashboard_data))
 
 
+# JMH units (lower case) to CloudWatch units
+UNITS = {
+    "s/op": "Seconds",
+    "bytes": "Bytes",
+    "byte": "Bytes",
+    "op/s": "Count/Second",
+    "ms": "Milliseconds"
+}
+
+
 def convert_units(input_unit):
     """
     Convert units into CloudWatch understandable units.
     """
     input_unit = input_unit.lower()
-    if input_unit == "s/op":
-        return "Seconds"
-    elif input_unit == "bytes" or input_unit == "byte":
-        return "Bytes"
-    elif input_unit == "op/s":
-        return "Count/Second"
-    elif input_unit == "ms":
-        return "Milliseconds"
-    else:
+    unit = UNITS.get(input_unit)
+    if unit is None:
         print("Unknown unit type", input_unit)
+    return unit
 
 
 def main():
@@ -65,6 +74,11 @@ def main():
     cw = boto3.client("cloudwatch")  # type: Client
     datapoints = []
     event_type = os.getenv("GITHUB_EVENT_NAME", "pull_request")
+    # Same for every datapoint, so only build it once
+    github_event_dim = {
+        "Name": "GitHub Event",
+        "Value": event_type
+    }
     secondary_metric_names = set()
 
     # Add jar size metric (if we can find the jar)
@@ -79,28 +93,23 @@ def main():
                     "Name": "Benchmark",
                     "Value": jar_size_metric_name
                 },
-                {
-                    "Name": "GitHub Event",
-                    "Value": event_type
-                }
+                github_event_dim
             ],
             "Unit": "Bytes"
         })
         secondary_metric_names.add(jar_size_metric_name)
 
     # Generate CloudWatch metrics from our benchmarks
+    append_datapoint = datapoints.append
     for benchmark in report:
         dims = [
             {
                 "Name": "Benchmark",
                 "Value": benchmark["benchmark"]
             },
-            {
-                "Name": "GitHub Event",
-                "Value": event_type
-            }
+            github_event_dim
         ]
-        datapoints.append({
+        append_datapoint({
             "MetricName": "ExecutionTime",
             "Value": benchmark["primaryMetric"]["score"],
             "Dimensions": dims,
@@ -108,7 +117,7 @@ def main():
         })
         if "secondaryMetrics" in benchmark:
             for metric_name, values in benchmark["secondaryMetrics"].items():
-                datapoints.append({
+                append_datapoint({
                     "MetricName": metric_name,
                     "Value": values["score"],
                     "Unit": convert_units(values["scoreUnit"]),
@@ -117,12 +126,15 @@ def main():
                 secondary_metric_names.add(metric_name)
 
     if event_type == "push":
-        # Put metrics up to CloudWatch in batches of 20 (their max limit)
-        for b in batch(datapoints, 20):
-            put_metrics_retryable(cw, namespace, b)
+        # Put metrics up to CloudWatch in batches of 1000 (their max limit). Our datapoints are a few hundred bytes
+        # each, so a full batch stays well under the 1 MB request size limit.
+        # Batches are independent, so upload them concurrently. The client is thread safe and each call still retries.
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            # Consume the results so that any failure is raised here
+            list(executor.map(lambda b: put_metrics_retryable(cw, namespace, b), batch(datapoints, 1000)))
 
         num_commit_history = 50
-        os.system(f"git fetch --depth={num_commit_history} origin master")
+        subprocess.run(["git", "fetch", f"--depth={num_commit_history}", "origin", "master"])
         # Get the last 50 commits to master with the short commit hash and commiter's date
         # Format like: 43a4929 2019-11-24T11:29:22-08:00
         commits_to_master = subprocess.check_output(["git", "log", "-n", str(num_commit_history),
@@ -132,10 +144,10 @@ def main():
         annotations = {
             "vertical": [
                 {
-                    "label": commit.split(" ")[0],
-                    "value": commit.split(" ")[1],
+                    "label": commit_hash,
+                    "value": commit_date,
                     "color": "#16b"  # Annotate with CloudWatch blue
-                } for commit in commits_to_master
+                } for commit_hash, commit_date in (commit.split(" ", 1) for commit in commits_to_master)
             ]
         }
 
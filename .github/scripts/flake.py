@@ -16,7 +16,7 @@ def main():
     parser.add_argument('--cmd', type=str, help='Command to run')
     parser.add_argument('-i', type=int, help='Iterations')
     parser.add_argument('--token', type=str, help='GitHub token')
-    parser.add_argument('--out-dir', type=str, help='Failed test output dir')
+    parser.add_argument('--out-dir', type=str, default='failed_tests/', help='Failed test output dir')
     parser.add_argument('-ff', action="store_true", help='Fail fast. If enabled, quit '
                                                          'after the first failure')
     args = parser.parse_args()
@@ -28,23 +28,25 @@ def main():
     # Dict for results as a dict of classname -> method name -> [failure details]
     results = defaultdict(lambda: defaultdict(list))
 
+    os.makedirs(args.out_dir, exist_ok=True)
     for i in range(0, iterations):
         print(f"Running iteration {i + 1} of {iterations}", flush=True)
-        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+        stdout_path = f'{args.out_dir}{i+1}-full-stdout.txt'
+        stderr_path = f'{args.out_dir}{i+1}-full-stderr.txt'
+        # Let the command write its output straight to disk rather than buffering all of it in memory
+        with open(stdout_path, 'wb') as stdout, open(stderr_path, 'wb') as stderr:
+            process = subprocess.run(command, stdout=stdout, stderr=stderr, shell=True)
         # If the tests failed, then we should check which test(s) failed in order to report it
         if process.returncode != 0:
-            print(f"Iteration {i + 1} failed, saving and parsing results now", flush=True)
-            os.makedirs(args.out_dir, exist_ok=True)
-            with open(f'{args.out_dir}{i+1}-full-stdout.txt', 'w') as f:
-                f.write(process.stdout.decode('utf-8'))
-            with open(f'{args.out_dir}{i+1}-full-stderr.txt', 'w') as f:
-                f.write(process.stderr.decode('utf-8'))
-
+            print(f"Iteration {i + 1} failed, parsing results now", flush=True)
             parse_test_results(i, results, args.out_dir)
             if args.ff:
                 break
         else:
             print("Succeeded with no failure", flush=True)
+            # Only keep the output of failed iterations
+            os.remove(stdout_path)
+            os.remove(stderr_path)
 
     if len(results) == 0:
         return
@@ -53,8 +55,9 @@ def main():
     print(json.dumps(results), flush=True)
 
     gh = GitHub(token=token)
+    repository = os.getenv("GITHUB_REPOSITORY")
     title = "[Bot] Flaky Test(s) Identified"
-    existing_issues = gh.repos[os.getenv("GITHUB_REPOSITORY")].issues.get(creator="app/github-actions")
+    existing_issues = gh.repos[repository].issues.get(creator="app/github-actions")
     if existing_issues[0] == 200:
         existing_issues = list(filter(lambda i: title in i["title"], existing_issues[1]))
     else:
@@ -70,12 +73,12 @@ def main():
 
     if existing_issues:
         issue_number = existing_issues[0]["number"]
-        updated_issue = gh.repos[os.getenv("GITHUB_REPOSITORY")].issues[issue_number].patch(body={"body": body,
-                                                                                                  "title": title})
+        updated_issue = gh.repos[repository].issues[issue_number].patch(body={"body": body,
+                                                                             "title": title})
         print(updated_issue, flush=True)
     else:
-        issue = gh.repos[os.getenv("GITHUB_REPOSITORY")].issues.post(body={"body": body,
-                                                                           "title": title})
+        issue = gh.repos[repository].issues.post(body={"body": body,
+                                                      "title": title})
         print(issue, flush=True)
 
 
@@ -86,30 +89,49 @@ def parse_test_results(iteration, previous_results, failed_test_dir):
         return
     reports = list(filter(lambda f: f.startswith("TEST-") and f.endswith(".xml"), os.listdir(report_dir)))
     for r in reports:
-        tree = ET.parse(report_dir + r)
-        for testcase in tree.getroot().findall("./testcase"):
+        # Most reports are for passing test classes, so skip them based on the suite's counts alone
+        if not report_has_failures(report_dir + r):
+            continue
+        # Stream each report so that only a single testcase (with its potentially large output) is held at a time
+        for _, testcase in ET.iterparse(report_dir + r, events=("end",)):
+            if testcase.tag != "testcase":
+                continue
             failure = None
             # Find failures and errors (there's no important difference between these for us)
-            if testcase.find("failure") is not None:
-                failure = testcase.find("failure").text
-            elif testcase.find("error") is not None:
-                failure = testcase.find("error").text
+            failure_node = testcase.find("failure")
+            if failure_node is None:
+                failure_node = testcase.find("error")
+            if failure_node is not None:
+                failure = failure_node.text
             if failure is None:
+                testcase.clear()
                 continue
 
             previous_results[testcase.get("classname")][testcase.get("name")] \
                 .append({"iteration": iteration, "failure": failure})
             # Save test stdout and stderr
             file_path_prefix = f'{failed_test_dir}{iteration}-{testcase.get("classname")}.{testcase.get("name")}-'
-            if testcase.find("system-out") is not None:
+            system_out = testcase.find("system-out")
+            if system_out is not None:
                 with open(f'{file_path_prefix}stdout.txt', 'w') as f:
-                    f.write(testcase.find("system-out").text)
-            if testcase.find("system-err") is not None:
+                    f.write(system_out.text)
+            system_err = testcase.find("system-err")
+            if system_err is not None:
                 with open(f'{file_path_prefix}stderr.txt', 'w') as f:
-                    f.write(testcase.find("system-err").text)
+                    f.write(system_err.text)
             # Save test failure exception traceback
             with open(f'{file_path_prefix}error.txt', 'w') as f:
                 f.write(failure)
+            testcase.clear()
+
+
+def report_has_failures(report_path):
+    """Check the testsuite root element's failure and error counts without parsing the testcases."""
+    # Open the file ourselves so it is closed even though we stop reading after the first element
+    with open(report_path, 'rb') as f:
+        for _, testsuite in ET.iterparse(f, events=("start",)):
+            return testsuite.get("failures", "1") != "0" or testsuite.get("errors", "1") != "0"
+    return False
 
 
 if __name__ == '__main__':